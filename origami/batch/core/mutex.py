@@ -1,30 +1,49 @@
 import sqlalchemy
+import sqlite3
 import datetime
 import os
 import portalocker
 import logging
-import time
+import threading
+import collections
+
+try:
+	import fcntl
+except ImportError:  # not available on Windows, use portalocker there.
+	fcntl = None
 
 from pathlib import Path
 from contextlib import contextmanager
 
 
+SQLITE_IOERR = 10
+
+
+def _is_transient(error):
+	# busy and locked errors are not transient here: sqlite already waited
+	# for them up to its timeout. only I/O errors (e.g. on NFS) are.
+	code = getattr(error.orig, "sqlite_errorcode", None)  # Python >= 3.11
+	if code is not None:
+		return (code & 0xff) == SQLITE_IOERR
+	else:
+		return "disk I/O error" in str(error.orig)
+
+
 def run_db_operation(operation):
-	backoff = 0
-	while True:
-		try:
-			return operation()
-		except sqlalchemy.exc.OperationalError as e:
-			if backoff > 8:
-				raise e
-			time.sleep(0.1 * (2 ** backoff))
-			backoff += 1
+	try:
+		return operation()
+	except sqlalchemy.exc.OperationalError as e:
+		if not _is_transient(e):
+			raise
+		logging.warning("mutex database operation failed, retrying once.", exc_info=True)
+		return operation()
 
 
 class DatabaseMutex:
-	def __init__(self, path, timeout=1):
+	def __init__(self, path, timeout=5, wal=False):
 		self._db_uri = 'sqlite:///%s' % str(Path(path))
 		self._timeout = timeout
+		self._wal = wal
 
 		self._engine = None
 		self._metadata = None
@@ -39,11 +58,12 @@ class DatabaseMutex:
 			logging.exception("Metadata creation failed.")
 
 	def __getstate__(self):
-		return dict(db_uri=self._db_uri, timeout=self._timeout)
+		return dict(db_uri=self._db_uri, timeout=self._timeout, wal=self._wal)
 
 	def __setstate__(self, newstate):
 		self._db_uri = newstate["db_uri"]
 		self._timeout = newstate["timeout"]
+		self._wal = newstate["wal"]
 		self._engine = None
 		self._metadata = None
 		self._mutex_table = None
@@ -53,8 +73,15 @@ class DatabaseMutex:
 		engine = sqlalchemy.create_engine(
 			self._db_uri,
 			isolation_level="SERIALIZABLE",
-			poolclass=sqlalchemy.pool.NullPool,
-			connect_args={"timeout": self._timeout})
+			poolclass=sqlalchemy.pool.SingletonThreadPool,
+			pool_size=1,
+			# the mutex only ever runs a handful of prebuilt statements, so
+			# keep their compiled forms for the lifetime of the engine.
+			execution_options=dict(compiled_cache=dict()),
+			connect_args={
+				"timeout": self._timeout,  # sqlite's busy timeout
+				"cached_statements": 256,
+				"check_same_thread": False})
 
 		# see https://docs.sqlalchemy.org/en/13/dialects/sqlite.html#pysqlite-serializable
 		@sqlalchemy.event.listens_for(engine, "connect")
@@ -63,11 +90,26 @@ class DatabaseMutex:
 			# also stops it from emitting COMMIT before any DDL.
 			dbapi_connection.isolation_level = None
 
+			cursor = dbapi_connection.cursor()
+			try:
+				if self._wal:
+					# WAL lets readers proceed while a writer holds the lock,
+					# but needs shared memory, i.e. it breaks on NFS.
+					cursor.execute("PRAGMA journal_mode=WAL")
+					cursor.execute("PRAGMA synchronous=NORMAL")
+				else:
+					self._leave_wal(cursor)
+				cursor.execute("PRAGMA temp_store=MEMORY")
+				cursor.execute("PRAGMA cache_size=-20000")
+			finally:
+				cursor.close()
+
 		@sqlalchemy.event.listens_for(engine, "begin")
 		def do_begin(conn):
-			conn.execute("BEGIN EXCLUSIVE")
+			conn.execute("BEGIN IMMEDIATE")
 
 		self._engine = engine
+		self._pid = os.getpid()
 
 		self._metadata = sqlalchemy.MetaData(self._engine)
 
@@ -79,18 +121,64 @@ class DatabaseMutex:
 			sqlalchemy.Column('time', sqlalchemy.DateTime, nullable=False),
 			sqlalchemy.PrimaryKeyConstraint('path', 'processor', name='mutex_pk'))
 
+		# build statements once, so that they get compiled only once.
+		table = self._mutex_table
+		self._insert_stmt = table.insert()
+		self._multi_insert_cache = dict()
+		self._count_locked_stmt = sqlalchemy.select([
+			sqlalchemy.func.count()]).select_from(table).where(sqlalchemy.and_(
+				table.c.path.in_(sqlalchemy.bindparam('paths', expanding=True)),
+				table.c.processor == sqlalchemy.bindparam('p')))
+		self._delete_all_stmt = table.delete()
+		self._delete_older_stmt = table.delete().where(
+			table.c.time < sqlalchemy.bindparam('t', type_=sqlalchemy.DateTime))
+		self._delete_by_owner_stmt = table.delete().where(sqlalchemy.and_(
+			table.c.processor == sqlalchemy.bindparam('p'),
+			table.c.path.in_(sqlalchemy.bindparam('paths', expanding=True)),
+			table.c.pid == sqlalchemy.bindparam('pid')))
+
+	def _leave_wal(self, cursor):
+		# journal mode is persistent, so undo an earlier WAL opt-in. this
+		# fails while other WAL connections are open, which is fine.
+		cursor.execute("PRAGMA journal_mode")
+		if cursor.fetchone()[0].lower() != "wal":
+			return
+		try:
+			cursor.execute("PRAGMA journal_mode=DELETE")
+		except sqlite3.OperationalError:
+			logging.warning(
+				"could not leave WAL mode on mutex database.", exc_info=True)
+
+	def _connection(self):
+		if self._pid != os.getpid():
+			# pooled connections must not be shared across forks.
+			self._connect()
+		return self._engine.connect()
+
+	def _multi_insert_stmt(self, n):
+		# a single INSERT with n value tuples, cached per n.
+		stmt = self._multi_insert_cache.get(n)
+		if stmt is None:
+			shared = dict(
+				processor=sqlalchemy.bindparam('processor'),
+				pid=sqlalchemy.bindparam('pid'),
+				time=sqlalchemy.bindparam('time', type_=sqlalchemy.DateTime))
+			stmt = self._insert_stmt.values([
+				dict(path=sqlalchemy.bindparam('path_%d' % i), **shared)
+				for i in range(n)])
+			self._multi_insert_cache[n] = stmt
+		return stmt
+
 	def clear_locks(self, age=0):
 		def perform():
-			conn = self._engine.connect()
+			conn = self._connection()
 
 			try:
-				table = self._mutex_table
 				if age == 0:
-					stmt = table.delete()
+					conn.execute(self._delete_all_stmt)
 				else:
-					stmt = table.delete().where(sqlalchemy.and_(
-						table.c.time < datetime.datetime.now() - datetime.timedelta(seconds=age)))
-				conn.execute(stmt)
+					conn.execute(self._delete_older_stmt, dict(
+						t=datetime.datetime.now() - datetime.timedelta(seconds=age)))
 			finally:
 				conn.close()
 
@@ -98,20 +186,27 @@ class DatabaseMutex:
 
 	def try_lock(self, processor, paths):
 		def perform():
-			conn = self._engine.connect()
+			conn = self._connection()
 
 			try:
-				conn.execute(self._mutex_table.insert(), [
-					dict(
-						path=p,
-						processor=processor,
-						pid=os.getpid(),
-						time=datetime.datetime.now()
-					) for p in paths
-				])
-
-				locked = True
+				with conn.begin():
+					# check for existing locks first, so that contention
+					# does not need to go through a failing INSERT.
+					n_locked = conn.execute(self._count_locked_stmt, dict(
+						paths=list(paths), p=processor)).scalar()
+
+					if n_locked == 0:
+						params = dict(
+							processor=processor,
+							pid=os.getpid(),
+							time=datetime.datetime.now())
+						for i, p in enumerate(paths):
+							params['path_%d' % i] = p
+						conn.execute(self._multi_insert_stmt(len(paths)), params)
+
+				locked = n_locked == 0
 			except sqlalchemy.exc.IntegrityError as e:
+				# should not happen, as we checked inside the transaction.
 				locked = False
 			finally:
 				conn.close()
@@ -122,15 +217,13 @@ class DatabaseMutex:
 
 	def unlock(self, processor, paths):
 		def perform():
-			conn = self._engine.connect()
+			conn = self._connection()
 
 			try:
-				table = self._mutex_table
-				stmt = table.delete().where(sqlalchemy.and_(
-					table.c.processor == processor,
-					table.c.path.in_(paths),
-					table.c.pid == os.getpid()))
-				conn.execute(stmt)
+				conn.execute(self._delete_by_owner_stmt, dict(
+					p=processor,
+					paths=list(paths),
+					pid=os.getpid()))
 			finally:
 				conn.close()
 
@@ -146,14 +239,98 @@ class DatabaseMutex:
 				self.unlock(processor, paths)
 
 
+def _same_file(fd, path):
+	a = os.fstat(fd)
+	b = os.stat(path)
+	return (a.st_dev, a.st_ino) == (b.st_dev, b.st_ino)
+
+
+class _FileDescriptorCache:
+	""" keeps lock files open, so that locking does not need to open and
+	close them every time. """
+
+	def __init__(self, max_size=64):
+		self._max_size = max_size
+		self._fds = collections.OrderedDict()
+		self._locked = set()
+		self._pid = None
+		self._lock = threading.Lock()
+
+	def _reset_after_fork(self):
+		# descriptors inherited over fork share their flock with the parent.
+		for fd in self._fds.values():
+			os.close(fd)
+		self._fds.clear()
+		self._locked.clear()
+		self._pid = os.getpid()
+
+	def _fd(self, path):
+		fd = self._fds.get(path)
+		if fd is not None and not _same_file(fd, path):
+			# path was replaced, locking the old inode would not exclude
+			# processes that open the new one.
+			os.close(self._fds.pop(path))
+			fd = None
+		if fd is None:
+			fd = os.open(path, os.O_RDONLY)
+			self._fds[path] = fd
+			n_evict = len(self._fds) - self._max_size
+			if n_evict > 0:
+				unused = [p for p in self._fds.keys() if p not in self._locked]
+				for p in unused[:n_evict]:
+					os.close(self._fds.pop(p))
+		else:
+			self._fds.move_to_end(path)
+		return fd
+
+	def try_lock(self, path):
+		with self._lock:
+			if self._pid != os.getpid():
+				self._reset_after_fork()
+			if path in self._locked:
+				return False  # flock would succeed again on the same fd.
+			fd = self._fd(path)
+			try:
+				fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			except OSError:
+				# already locked, but also e.g. ENOLCK or EACCES on NFS.
+				return False
+			self._locked.add(path)
+			return True
+
+	def unlock(self, path):
+		with self._lock:
+			fcntl.flock(self._fds[path], fcntl.LOCK_UN)
+			self._locked.remove(path)
+
+
+_fd_cache = _FileDescriptorCache()
+
+
 class FileMutex:
 	@contextmanager
 	def lock(self, processor, paths):
 		if len(paths) != 1:
 			raise RuntimeError("FileMutex does not support chunked locking")
+		if fcntl is None:
+			with self._portalocker_lock(paths[0]) as locked:
+				yield locked
+			return
+
+		path = str(paths[0])
+		if not _fd_cache.try_lock(path):
+			yield False
+			return
+		try:
+			yield True
+		finally:
+			_fd_cache.unlock(path)
+
+	@contextmanager
+	def _portalocker_lock(self, path):
 		try:
 			with portalocker.Lock(
-					paths[0],
+					path,
 					"r",
 					flags=portalocker.LOCK_EX,
 					timeout=1,
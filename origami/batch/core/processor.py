@@ -234,6 +234,7 @@ class Processor:
 		self._lock_strategy = options.get("lock_strategy", "DB")
 		self._lock_level = options.get("lock_level", "PAGE")
 		self._lock_timeout = options.get("lock_timeout", "60")
+		self._lock_database_wal = options.get("lock_database_wal", False)
 		self._max_lock_age = options.get("max_lock_age")
 		self._lock_chunk_size = 25
 		self._mutex = None
@@ -302,6 +303,11 @@ class Processor:
 				type=click.Path(),
 				required=False,
 				help="Mutex database path used for concurrent processing"),
+			click.option(
+				'--lock-database-wal',
+				is_flag=True,
+				default=False,
+				help="Use SQLite's WAL mode for the mutex database. Only safe if the database is on a local file system (not NFS)."),
 			click.option(
 				'--lock-timeout',
 				type=int,
@@ -586,7 +592,7 @@ class Processor:
 				db_path = Path(path).parent / "origami.lock.db"
 
 			self._mutex = DatabaseMutex(
-				db_path, timeout=self._lock_timeout)
+				db_path, timeout=self._lock_timeout, wal=self._lock_database_wal)
 
 			self._mutex.clear_locks(self._max_lock_age)
 
@@ -10,13 +10,14 @@ from itertools import chain
 
 class RegionsFilter:
 	def __init__(self, spec):
-		self._paths = set()
-		for s in spec.split(","):
-			self._paths.add(
-				tuple(s.strip().split("/")))
+		self._paths = frozenset(
+			tuple(s.strip().split("/")) for s in spec.split(","))
 
 	def __call__(self, path):
-		return tuple(path[:2]) in self._paths
+		if isinstance(path, tuple):
+			return path[:2] in self._paths
+		else:
+			return tuple(path[:2]) in self._paths
 
 	@property
 	def paths(self):
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
 import click
+import shapely
 import shapely.ops
 import shapely.wkt
 import zipfile
 import logging
+import io
+import numpy as np
 
 from pathlib import Path
 
@@ -13,30 +16,100 @@ from origami.batch.core.io import Artifact, Stage, Input, Output
 from origami.core.dewarp import Grid, Samples
 
 
+def transform_geoms(transformer, geoms):
+	# Shapely 2 gathers the coordinates of all geometries into one (N, 2)
+	# array, so that the transformer is called only once per page. older
+	# versions need to call it once per coordinate sequence.
+	if hasattr(shapely, "transform"):
+		return list(shapely.transform(
+			np.array(geoms, dtype=object), transformer.transform_coords))
+	else:
+		return [shapely.ops.transform(transformer, geom) for geom in geoms]
+
+
+def loads_wkts(data):
+	if hasattr(shapely, "from_wkt"):
+		return list(shapely.from_wkt(np.array(data, dtype=object)))
+	else:
+		return [shapely.wkt.loads(x.decode("utf8")) for x in data]
+
+
+def dumps_wkts(geoms):
+	if hasattr(shapely, "to_wkt"):
+		return list(shapely.to_wkt(
+			np.array(geoms, dtype=object), rounding_precision=-1))
+	else:
+		return [geom.wkt for geom in geoms]
+
+
+def repair_geoms(geoms, min_area):
+	# returns the geometries, with invalid ones repaired through buffer(0),
+	# and masks for lost, unexpectedly typed and still invalid geometries.
+	if hasattr(shapely, "is_valid"):
+		geoms = np.array(geoms, dtype=object)
+		lost = shapely.is_empty(geoms) | (shapely.area(geoms) < min_area)
+		unexpected = ~lost & ~np.isin(
+			shapely.get_type_id(geoms),
+			(shapely.GeometryType.POLYGON, shapely.GeometryType.LINESTRING))
+		broken = ~lost & ~shapely.is_valid(geoms)
+		geoms[broken] = shapely.buffer(geoms[broken], 0)
+		invalid = broken & ~shapely.is_valid(geoms)
+		return list(geoms), lost, unexpected, invalid
+	else:
+		geoms = list(geoms)
+		lost = np.array([
+			g.is_empty or g.area < a for g, a in zip(geoms, min_area)], dtype=bool)
+		unexpected = ~lost & np.array([
+			g.geom_type not in ("Polygon", "LineString") for g in geoms], dtype=bool)
+		broken = ~lost & np.array([not g.is_valid for g in geoms], dtype=bool)
+		for i in np.flatnonzero(broken):
+			geoms[i] = geoms[i].buffer(0)
+		invalid = broken & np.array([not g.is_valid for g in geoms], dtype=bool)
+		return geoms, lost, unexpected, invalid
+
+
 def dewarped_contours(warped, transformer, min_areas):
+	names = []
+	data = []
+
+	# fetch the whole archive with one sequential read, instead of one
+	# seek and read per entry, which is slow on network mounts.
 	with open(warped.path(Artifact.CONTOURS), "rb") as f:
-		with zipfile.ZipFile(f, "r") as zf:
-			for name in zf.namelist():
-				if not name.endswith(".wkt"):
-					continue
-				path = tuple(name.rsplit(".", 1)[0].split("/"))
-				geom = shapely.wkt.loads(zf.read(name).decode("utf8"))
-				warped_geom = geom
-				assert not warped_geom.is_empty
-				geom = shapely.ops.transform(transformer, geom)
-				if geom.is_empty or geom.area < min_areas.get(path[0], 0):
-					logging.warning(
-						"lost contour %s (A=%.1f) during dewarping." % (
-							path, warped_geom.area))
-					continue
-				if geom.geom_type not in ("Polygon", "LineString"):
-					logging.error("dewarped contour %s is %s" % (
-						name, geom.geom_type))
-				if not geom.is_valid:
-					geom = geom.buffer(0)
-					if not geom.is_valid:
-						logging.error("invalid geom %s", geom)
-				yield name, geom.wkt.encode("utf8")
+		archive = io.BytesIO(f.read())
+
+	with zipfile.ZipFile(archive, "r") as zf:
+		for name in zf.namelist():
+			if not name.endswith(".wkt"):
+				continue
+			names.append(name)
+			data.append(zf.read(name))
+
+	if not names:
+		return
+
+	warped_geoms = loads_wkts(data)
+	assert not any(geom.is_empty for geom in warped_geoms)
+
+	geoms = transform_geoms(transformer, warped_geoms)
+
+	paths = [tuple(name.rsplit(".", 1)[0].split("/")) for name in names]
+	min_area = np.array([min_areas.get(path[0], 0) for path in paths])
+	geoms, lost, unexpected, invalid = repair_geoms(geoms, min_area)
+
+	for i in np.flatnonzero(lost):
+		logging.warning(
+			"lost contour %s (A=%.1f) during dewarping." % (
+				paths[i], warped_geoms[i].area))
+	for i in np.flatnonzero(unexpected):
+		logging.error("dewarped contour %s is %s" % (
+			names[i], geoms[i].geom_type))
+	for i in np.flatnonzero(invalid):
+		logging.error("invalid geom %s", geoms[i])
+
+	keep = np.flatnonzero(~lost)
+	yield from zip(
+		[names[i] for i in keep],
+		dumps_wkts([geoms[i] for i in keep]))
 
 
 class DewarpProcessor(Processor):
@@ -86,8 +159,12 @@ class DewarpProcessor(Processor):
 				warped, grid.transformer, min_areas=min_areas):
 				zf.writestr(name, data)
 
+		# assemble the transform in memory and write it out in one go.
+		buffer = io.BytesIO()
+		grid.save(buffer)
+
 		with output.dewarping_transform() as f:
-			grid.save(f)
+			f.write(buffer.getvalue())
 
 
 @click.command()
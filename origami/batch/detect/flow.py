@@ -367,19 +367,14 @@ class FlowDetectionProcessor(Processor):
 		min_length = page.geometry(dewarped=False).rel_length(
 			self._options["min_line_length"])
 
-		def filter_geoms(geoms, length):
-			return dict(
-				(k, g) for k, g in geoms.items()
-				if length(g) > min_length)
-
-		lines = filter_geoms(lines, lambda l: l.unextended_length)
-		separators = filter_geoms(separators, lambda g: g.length)
-
 		r_filter = RegionsFilter(self._options["regions"])
+
 		lines = dict(
-			(k, g)
-			for k, g in lines.items()
-			if r_filter(k))
+			(k, l) for k, l in lines.items()
+			if r_filter(k) and l.unextended_length > min_length)
+		separators = dict(
+			(k, g) for k, g in separators.items()
+			if g.length > min_length)
 
 		if separators is not None and rescale_separators:  # legacy mode
 			sx = self._width / 1280
@@ -149,7 +149,8 @@ class Regions:
 
 	@cached_property
 	def grayscale(self):
-		return np.array(self._page.dewarped.convert("L"))
+		# pages are already single channel "L", no need to convert again.
+		return self._page.pixels(dewarped=True)
 
 	@cached_property
 	def binarized(self):
@@ -903,7 +904,7 @@ class SplitDetector:
 
 	def __call__(self, pixels, scale):
 		if pixels.dtype == np.uint8:
-			pixels = pixels.astype(np.float32) / 255.0
+			pixels = np.multiply(pixels, np.float32(1 / 255), dtype=np.float32)
 
 		assert pixels.dtype == np.float32
 
@@ -28,7 +28,7 @@ class ConfidenceSampler:
 		for p in segmentation.predictions:
 			self._predictions[p.name] = p
 
-		self._page = list(blocks.values())[0].page
+		self._page = next(iter(blocks.values())).page
 		self._page_shape = tuple(reversed(self._page.warped.size))
 
 	def __call__(self, path, line, res=0.5):
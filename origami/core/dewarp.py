@@ -22,7 +22,7 @@ import io
 import zipfile
 import json
 import logging
-import multiprocessing
+import multiprocessing.pool
 
 from cached_property import cached_property
 from functools import lru_cache
@@ -141,7 +141,10 @@ class Field:
 
 
 class Transformer:
-	def __init__(self, grid, grid_res):
+	def __init__(self, grid, grid_res, num_threads=2, min_points_per_thread=10000):
+		self._num_threads = num_threads
+		self._min_points_per_thread = min_points_per_thread
+
 		h, w = grid.shape[:2]
 
 		source = grid.reshape((h * w, 2))
@@ -160,6 +163,25 @@ class Transformer:
 		assert not np.any(np.isnan(pts))
 		return pts[:, 0], pts[:, 1]
 
+	def transform_coords(self, coords):
+		# same as __call__, but on (N, 2) arrays (as used by shapely.transform).
+		num_threads = min(
+			self._num_threads, len(coords) // self._min_points_per_thread)
+
+		if num_threads < 2:
+			pts = self._interp(coords)
+		else:
+			# scipy's interpolation releases the GIL, so threads scale here.
+			slices = make_slices(n=len(coords), k=num_threads)
+
+			with multiprocessing.pool.ThreadPool(
+				processes=num_threads) as pool:
+				pts = np.concatenate(pool.map(
+					lambda sel: self._interp(coords[sel]), slices))
+
+		assert not np.any(np.isnan(pts))
+		return pts
+
 
 def extrapolate(a, b, x):
 	v = b - a
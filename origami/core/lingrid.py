@@ -185,8 +185,13 @@ class Interpolator:
 			return self._extra(pts)
 		else:
 			ri = self._inter(pts)
-			rx = self._extra(pts)
-			return np.where(np.isnan(ri), rx, ri)
+			# only extrapolate points that fall outside the convex hull.
+			mask = np.isnan(ri)
+			rows = mask.reshape(len(pts), -1).any(axis=1)
+			if np.any(rows):
+				rx = self._extra(pts[rows])
+				ri[rows] = np.where(mask[rows], rx, ri[rows])
+			return ri
 
 
 class InterpolatorFactory:
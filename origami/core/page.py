@@ -1,4 +1,3 @@
-import skimage
 import math
 import collections
 import numpy as np
@@ -51,16 +50,37 @@ class Annotations:
 
 		results = collections.defaultdict(list)
 		matrix = self.label_to_image_matrix
+
+		geoms = []
 		for prediction_class, shapes in data.items():
 			for shape in shapes:
 				if isinstance(shape, shapely.geometry.base.BaseGeometry):
-					t_shape = shapely.affinity.affine_transform(shape, matrix)
+					geoms.append(shape)
+					results[prediction_class].append(None)  # filled below
 				else:
-					t_shape = shape.affine_transform(matrix)
-				results[prediction_class].append(t_shape)
+					results[prediction_class].append(shape.affine_transform(matrix))
+
+		if geoms:
+			t_geoms = iter(self._transform_geoms(geoms))
+			for t_shapes in results.values():
+				for i, t_shape in enumerate(t_shapes):
+					if t_shape is None:
+						t_shapes[i] = next(t_geoms)
 
 		return results
 
+	def _transform_geoms(self, geoms):
+		matrix = self.label_to_image_matrix
+		if hasattr(shapely, "transform"):
+			# apply the 2d part of the matrix to all coordinates at once.
+			a, b, d, e = matrix[[0, 1, 3, 4]]
+			m = np.array([[a, b], [d, e]], dtype=np.float64)
+			t = np.array(matrix[9:11], dtype=np.float64)
+			return shapely.transform(
+				np.array(geoms, dtype=object), lambda xy: xy @ m.T + t)
+		else:
+			return [shapely.affinity.affine_transform(g, matrix) for g in geoms]
+
 
 def _find_image_path(path):
 	path = Path(path)
@@ -78,25 +98,27 @@ def _find_image_path(path):
 		return candidates[0]
 
 
+def _readonly_pixels(im):
+	pixels = np.asarray(im)
+	pixels.setflags(write=False)
+	return pixels
+
+
 class Page:
 	def __init__(self, path, dewarping_transform=None):
 		path = _find_image_path(path)
-		self._warped = PIL.Image.open(str(path)).convert("L")
-
-		if dewarping_transform is not None:
-			self._dewarper = Dewarper(self._warped, dewarping_transform)
-			self._dewarped = self._dewarper.dewarped
-		else:
-			self._dewarper = None
-			self._dewarped = None
+		# only parses the image header, decoding happens on first access.
+		self._im = PIL.Image.open(str(path))
+		self._dewarping_transform = dewarping_transform
 
-	@property
+	@cached_property
 	def warped(self):
-		return self._warped
+		return self._im.convert("L")
 
 	@property
 	def dewarped(self):
-		return self._dewarped
+		dewarper = self.dewarper
+		return dewarper.dewarped if dewarper is not None else None
 
 	@cached_property
 	def binarized(self):
@@ -104,14 +126,29 @@ class Page:
 		return binarizer(self.warped)
 
 	def size(self, dewarped):
-		return (self._dewarped if dewarped else self._warped).size
+		if dewarped:
+			return self.dewarped.size
+		else:
+			return self._im.size
 
 	def geometry(self, dewarped):
 		return Geometry(*self.size(dewarped))
 
+	@cached_property
+	def _warped_pixels(self):
+		return _readonly_pixels(self.warped)
+
+	@cached_property
+	def _dewarped_pixels(self):
+		return _readonly_pixels(self.dewarped)
+
 	def pixels(self, dewarped):
-		return np.array(self._dewarped if dewarped else self._warped)
+		# cached and shared, as blocks fetch these for every line they
+		# extract. the returned array is read-only, copy before modifying.
+		return self._dewarped_pixels if dewarped else self._warped_pixels
 
-	@property
+	@cached_property
 	def dewarper(self):
-		return self._dewarper
+		if self._dewarping_transform is None:
+			return None
+		return Dewarper(self.warped, self._dewarping_transform)